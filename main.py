@@ -1,19 +1,39 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, timedelta
 from pathlib import Path
+import json
 import os
+import threading
 
 from dotenv import load_dotenv
+import pythoncom
 import win32com.client as win32
+import numpy as np
 import pandas as pd
+import xlsxwriter
 
-# Get the current parent path
-SCRIPT_DIR = Path(__file__).parent
+try:
+    from numba import njit
+except ImportError:  # numba is optional, sales are aggregated with pandas without it
+    njit = None
+
+# Get the current parent path (resolved once, so every path built from it is absolute)
+SCRIPT_DIR = Path(__file__).resolve().parent
 
 # Load environment variables from .env file
 load_dotenv(dotenv_path=SCRIPT_DIR / '.env')
 
 # GLOBAL VARIABLES
 
+# Number of stores processed in parallel
+MAX_WORKERS = 8
+
+# Output directory for backup files
+BACKUP_DIR = SCRIPT_DIR / 'store_backup_files'
+
+# Running YTD aggregates, updated incrementally on each run
+YTD_STATE_PATH = BACKUP_DIR / 'ytd_kpis_state.json'
+
 # Financial Targets
 DAILY_TARGETS = {
     'revenue': 1_000,
@@ -27,76 +47,82 @@ YTD_TARGETS = {
     'avg_ticket': 500
 }
         
-EMAIL_FROM = os.getenv('EMAIL_FROM')
-if not EMAIL_FROM:
-    raise ValueError('EMAIL_FROM environment variable is not set.')
-
-## Functions
-def construct_kpi_list(row, targets, period):
-    '''
-    Construct a list of KPI dictionaries for a given period (daily or YTD).
-
-    Args:
-        row (pd.Series): A row of the DataFrame containing KPI values.
-        targets (dict): A dictionary of target values for the KPIs (e.g., revenue, distinct_products, avg_ticket).
-        period (str): The period for the KPIs ('daily', 'YTD').
-
-    Returns:
-        list: A list of dictionaries, each representing a KPI with its name, value, target and type.
-    '''
-    return [
-        {'name': 'Revenue', 'value': getattr(row, f'revenue_{period}'), 'target': targets['revenue'], 'type': 'currency'},
-        {'name': 'Distinct Products', 'value': getattr(row, f'distinct_products_{period}'), 'target': targets['distinct_products'], 'type': 'integer'},
-        {'name': 'Avg Ticket', 'value': getattr(row, f'avg_ticket_{period}'), 'target': targets['avg_ticket'], 'type': 'currency'}
-    ]
-
-def format_kpi_table(kpis, title, is_YTD=False):
-    '''
-    Formats a KPI table as an HTML string.
-
-    Args:
-        kpis (list): A list of dictionaries representing KPIs.
-        title (str): The title of the table (e.g., 'Daily Values').
-        is_YTD (bool): Whether the KPIs are YTD. Default is False.
-    
-    Returns:
-        str: An HTML string for the table.
-    '''
-    table = f'''
+# KPIs shown in the tables, with the column they are read from and how their values are formatted
+KPI_DEFINITIONS = [
+    {'name': 'Revenue', 'column': 'revenue', 'format': '${:,.2f}'.format},
+    {'name': 'Distinct Products', 'column': 'distinct_products', 'format': lambda value: f'{int(value)}'},
+    {'name': 'Avg Ticket', 'column': 'avg_ticket', 'format': '${:,.2f}'.format}
+]
+
+# HTML templates for the KPI tables
+KPI_TABLE_HEADER = '''
     <div style='text-align: center; margin-bottom: 10px; font-size: 16pt'>
         <b>{title}</b>
-    '''
-    table += '''
+    
     <table border='1' cellpadding='10' cellspacing='0' style='border-collapse: collapse; text-align: center; font-size: 14pt; margin: 20px 0; background-color: #f9f9f9; width: 100%; font-family: Calibri, sans-serif;'>
         <thead>
             <tr>
                 <th>Indicator</th>
-                <th>{}</th>
+                <th>{value_header}</th>
                 <th>Target</th>
                 <th>Scenario</th>
             </tr>
         </thead>
         <tbody>
-    '''.format('Year Value' if is_YTD else 'Day Value')
-
-    for kpi in kpis:
-        value = f'${kpi['value']:,.2f}' if kpi['type'] == 'currency' else f'{int(kpi['value'])}'
-        target = f'${kpi['target']:,.2f}' if kpi['type'] == 'currency' else f'{int(kpi['target'])}'
-        color = "green" if kpi['value'] >= kpi['target'] else "red"
-        symbol = '◙'
-        table += f'''
+    '''
+
+KPI_TABLE_ROW = '''
             <tr>
-                <td>{kpi['name']}</td>
+                <td>{name}</td>
                 <td>{value}</td>
                 <td>{target}</td>
                 <td style="color: {color}; font-size: 18pt;">{symbol}</td>
             </tr>
         '''
-    table += '''
+
+KPI_TABLE_FOOTER = '''
         </tbody>
     </table>
     '''
-    return table
+
+# Outlook objects cached per thread, as COM objects can only be used by the thread that created them
+OUTLOOK_CACHE = threading.local()
+
+EMAIL_FROM = os.getenv('EMAIL_FROM')
+if not EMAIL_FROM:
+    raise ValueError('EMAIL_FROM environment variable is not set.')
+
+## Functions
+def format_kpi_tables(df, targets, period, title, is_YTD=False):
+    '''
+    Formats the KPI table of a period as an HTML string for every row of a DataFrame.
+
+    Values and scenario colors are formatted column by column, so each row only has its strings filled in.
+
+    Args:
+        df (pd.DataFrame): DataFrame with a column per KPI and period (e.g., revenue_daily).
+        targets (dict): A dictionary of target values for the KPIs (e.g., revenue, distinct_products, avg_ticket).
+        period (str): The period for the KPIs ('daily', 'YTD').
+        title (str): The title of the table (e.g., 'Daily Values').
+        is_YTD (bool): Whether the KPIs are YTD. Default is False.
+    
+    Returns:
+        pd.Series: HTML strings for the tables, aligned with df.
+    '''
+    tables = pd.Series(
+        KPI_TABLE_HEADER.format(title=title, value_header='Year Value' if is_YTD else 'Day Value'),
+        index=df.index
+    )
+    for kpi in KPI_DEFINITIONS:
+        values = df[f'{kpi['column']}_{period}']
+        target = targets[kpi['column']]
+        formatted_target = kpi['format'](target)
+        colors = np.where(values >= target, 'green', 'red')
+        tables += [
+            KPI_TABLE_ROW.format(name=kpi['name'], value=value, target=formatted_target, color=color, symbol='◙')
+            for value, color in zip(values.map(kpi['format']), colors)
+        ]
+    return tables + KPI_TABLE_FOOTER
 
 def get_ranking_info(df, column_name='revenue'):
     '''
@@ -116,6 +142,23 @@ def get_ranking_info(df, column_name='revenue'):
     worst_store_value = sorted_df.iloc[-1][column_name]
     return sorted_df, best_store_name, best_store_value, worst_store_name, worst_store_value
 
+def get_outlook(email_from):
+    '''
+    Gets the Outlook application and the sender account, dispatching them only on the first call of each thread.
+
+    Args:
+        email_from (str): Sender email address.
+    
+    Returns:
+        tuple: (outlook, account)
+    '''
+    if not hasattr(OUTLOOK_CACHE, 'outlook'):
+        OUTLOOK_CACHE.outlook = win32.Dispatch('outlook.application')
+        OUTLOOK_CACHE.accounts = {}
+    if email_from not in OUTLOOK_CACHE.accounts:
+        OUTLOOK_CACHE.accounts[email_from] = OUTLOOK_CACHE.outlook.Session.Accounts[email_from]
+    return OUTLOOK_CACHE.outlook, OUTLOOK_CACHE.accounts[email_from]
+
 def send_email(email_from, email_to, subject, email_body, file_paths=None, preview=False):
     '''
     Sends an email using Outlook automation.
@@ -125,15 +168,14 @@ def send_email(email_from, email_to, subject, email_body, file_paths=None, previ
         email_to (str): Recipient email address.
         subject (str): Subject of the email.
         email_body (str): HTML content of the email body.
-        file_paths (list, optional): List of file paths to attach. Defaults to None.
+        file_paths (list, optional): List of absolute file paths to attach. Defaults to None.
         preview (bool): If True, displays the email instead of sending it. Default is False.
     '''
     # Create mail item in Outlook
-    outlook = win32.Dispatch('outlook.application')
+    outlook, account = get_outlook(email_from)
     email = outlook.CreateItem(0) 
 
     # Account selection
-    account = outlook.Session.Accounts[email_from] 
     email._oleobj_.Invoke(*(64209, 0, 8, 0, account))
 
     # Email personalization
@@ -144,11 +186,10 @@ def send_email(email_from, email_to, subject, email_body, file_paths=None, previ
     # Add attachments if provided
     if file_paths:
         for file_path in file_paths:
-            path = Path(file_path)
-            if path.exists() and path.is_file():
-                email.Attachments.Add(str(path.resolve())) # Convert Path object to string
+            if os.path.isfile(file_path):
+                email.Attachments.Add(os.fspath(file_path)) # Convert Path object to string
             else:
-                print(f'Warning: File not found - {path}')
+                print(f'Warning: File not found - {file_path}')
 
     # Preview or send email
     if preview:
@@ -167,7 +208,7 @@ def standardize_column_names(df):
     Returns:
         pd.DataFrame: DataFrame with standardized column names.
     '''
-    df.columns = df.columns.str.lower().str.replace(' ', '_')
+    df.columns = [column.lower().replace(' ', '_') for column in df.columns]
     return df
 
 def restore_column_names(df):
@@ -180,74 +221,408 @@ def restore_column_names(df):
     Returns:
         pd.DataFrame: DataFrame with restored column names.
     '''
-    df.columns = df.columns.str.title().str.replace('_', ' ')
+    df.columns = [column.title().replace('_', ' ') for column in df.columns]
     return df
 
+def read_excel_file(file_path):
+    '''
+    Reads the first sheet of an Excel workbook using the calamine engine.
+
+    Args:
+        file_path (Path): Path to the .xlsx file to be read.
+    
+    Returns:
+        pd.DataFrame: DataFrame with standardized column names.
+    '''
+    with pd.ExcelFile(file_path, engine='calamine') as workbook:
+        return standardize_column_names(workbook.parse(0))
+
+def save_excel_file(df, file_path):
+    '''
+    Saves a DataFrame to an .xlsx file, streaming it row by row with xlsxwriter's constant memory mode.
+
+    pandas writes cells column by column, which constant memory mode does not support, so rows are written directly.
+    Dates and datetimes are written as Excel dates with a yyyy/mm/dd format and missing values as blank cells.
+
+    Args:
+        df (pd.DataFrame): The DataFrame to be saved.
+        file_path (Path): Path of the .xlsx file to be created.
+    '''
+    workbook = xlsxwriter.Workbook(file_path, {'constant_memory': True, 'default_date_format': 'yyyy/mm/dd'})
+    worksheet = workbook.add_worksheet()
+    header_format = workbook.add_format({'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'})
+    worksheet.write_row(0, 0, df.columns, header_format)
+
+    # Missing values (NaN, NA, NaT) are not supported by xlsxwriter, so they are replaced as each row is written
+    has_missing = any(values.hasnans for _, values in df.items())
+    for row_number, row in enumerate(df.itertuples(index=False), start=1):
+        if has_missing:
+            row = [None if pd.isna(value) else value for value in row]
+        worksheet.write_row(row_number, 0, row)
+    workbook.close()
+
+def aggregate_sales_kernel(store_codes, product_codes, sale_codes, revenue, n_products, n_sales, n_stores):
+    '''
+    Aggregates revenue per store and collects the (store, product) and (store, sale) pairs in a single pass over the sales.
+
+    Pairs are encoded as store * n + id, so once sorted and made unique the keys are grouped by store.
+    A pair is skipped when the id was last seen in the same store, so repeated pairs are mostly not collected.
+
+    Args:
+        store_codes (np.ndarray): Store code of each sale row (-1 for missing).
+        product_codes (np.ndarray): Product code of each sale row (-1 for missing).
+        sale_codes (np.ndarray): Sales code of each sale row, factorized (-1 for missing).
+        revenue (np.ndarray): Revenue of each sale row (NaN for missing).
+        n_products (int): Number of product codes.
+        n_sales (int): Number of sales codes.
+        n_stores (int): Number of store codes.
+    
+    Returns:
+        tuple: (store_revenue, store_rows, product_keys, sale_keys)
+    '''
+    store_revenue = np.zeros(n_stores)
+    store_rows = np.zeros(n_stores, dtype=np.int64)
+    product_keys = np.empty(len(store_codes), dtype=np.int64)
+    sale_keys = np.empty(len(store_codes), dtype=np.int64)
+    product_last_store = np.full(n_products, -1, dtype=np.int64)
+    sale_last_store = np.full(n_sales, -1, dtype=np.int64)
+    n_product_keys = 0
+    n_sale_keys = 0
+    for i in range(len(store_codes)):
+        store = store_codes[i]
+        if store < 0:
+            continue
+        store_rows[store] += 1
+        if not np.isnan(revenue[i]):
+            store_revenue[store] += revenue[i]
+        product = product_codes[i]
+        if product >= 0 and product_last_store[product] != store:
+            product_last_store[product] = store
+            product_keys[n_product_keys] = store * n_products + product
+            n_product_keys += 1
+        sale = sale_codes[i]
+        if sale >= 0 and sale_last_store[sale] != store:
+            sale_last_store[sale] = store
+            sale_keys[n_sale_keys] = store * n_sales + sale
+            n_sale_keys += 1
+    return store_revenue, store_rows, product_keys[:n_product_keys], sale_keys[:n_sale_keys]
+
+if njit is not None:
+    aggregate_sales_kernel = njit(cache=True)(aggregate_sales_kernel)
+
+def split_store_pairs(pairs, ids, n_stores):
+    '''
+    Splits the (store, id) pair keys returned by aggregate_sales_kernel into the ids of each store.
+
+    Args:
+        pairs (np.ndarray): Keys encoded as store * len(ids) + id code, possibly repeated.
+        ids (np.ndarray): The ids, indexed by their codes.
+        n_stores (int): Number of store codes.
+    
+    Returns:
+        tuple: (number of ids of each store, list with the array of ids of each store)
+    '''
+    if not len(pairs):
+        return np.zeros(n_stores, dtype=np.int64), [ids[:0]] * n_stores
+
+    # A mask over all possible keys is cheaper than sorting when it is no larger than the keys themselves
+    n_keys = n_stores * len(ids)
+    if n_keys <= len(pairs):
+        seen = np.zeros(n_keys, dtype=np.bool_)
+        seen[pairs] = True
+        pairs = np.flatnonzero(seen)
+    else:
+        pairs = np.sort(pairs)
+        pairs = pairs[np.concatenate(([True], pairs[1:] != pairs[:-1]))]
+
+    pair_stores, pair_ids = np.divmod(pairs, len(ids))
+    counts = np.bincount(pair_stores, minlength=n_stores)
+    return counts, np.split(ids[pair_ids], np.cumsum(counts)[:-1])
+
+def aggregate_sales(sales_df):
+    '''
+    Aggregates revenue, sold products and sales codes per store.
+
+    Uses the compiled aggregate_sales_kernel when numba is installed and a pandas groupby otherwise.
+
+    Args:
+        sales_df (pd.DataFrame): Sales with categorical store_id and product_id and a 'revenue' column.
+    
+    Returns:
+        pd.DataFrame: Indexed by store_id, with revenue, products and sales (arrays of ids),
+            distinct_products and distinct_sales columns.
+    '''
+    if njit is None:
+        kpis_df = sales_df.groupby('store_id', observed=True, sort=False).agg(
+            revenue=('revenue', 'sum'),
+            products=('product_id', 'unique'),
+            sales=('sales_code', 'unique'),
+            distinct_products=('product_id', 'nunique'),
+            distinct_sales=('sales_code', 'nunique')
+        )
+        for column in ('products', 'sales'):
+            kpis_df[column] = [ids[pd.notna(ids)] for ids in kpis_df[column]]
+        return kpis_df
+
+    store_ids = sales_df['store_id'].cat.categories
+    product_ids = sales_df['product_id'].cat.categories.to_numpy()
+    sale_codes, sales_codes = pd.factorize(sales_df['sales_code'])
+    store_revenue, store_rows, product_keys, sale_keys = aggregate_sales_kernel(
+        sales_df['store_id'].cat.codes.to_numpy(),
+        sales_df['product_id'].cat.codes.to_numpy(),
+        sale_codes,
+        sales_df['revenue'].to_numpy(dtype=np.float64),
+        len(product_ids),
+        len(sales_codes),
+        len(store_ids)
+    )
+    distinct_products, store_products = split_store_pairs(product_keys, product_ids, len(store_ids))
+    distinct_sales, store_sales = split_store_pairs(sale_keys, sales_codes.to_numpy(), len(store_ids))
+
+    observed = np.flatnonzero(store_rows)
+    return pd.DataFrame({
+        'revenue': store_revenue[observed],
+        'products': [store_products[store] for store in observed],
+        'sales': [store_sales[store] for store in observed],
+        'distinct_products': distinct_products[observed],
+        'distinct_sales': distinct_sales[observed]
+    }, index=pd.CategoricalIndex(store_ids[observed], dtype=sales_df['store_id'].dtype, name='store_id'))
+
+def load_ytd_state(state_path, yesterday_date):
+    '''
+    Loads the running YTD aggregates saved by a previous run.
+
+    The state is discarded (and rebuilt from the sales data) when it is missing, can't be parsed,
+    belongs to another year or already covers yesterday_date, which is always recomputed.
+
+    Args:
+        state_path (Path): Path to the JSON state file.
+        yesterday_date (date): The date being reported.
+    
+    Returns:
+        dict: {'last_date': date or None, 'stores': {store_id: {'revenue', 'products', 'sales'}}}
+    '''
+    empty_state = {'last_date': None, 'stores': {}}
+    if not state_path.exists():
+        return empty_state
+
+    try:
+        with open(state_path, encoding='utf-8') as state_file:
+            state = json.load(state_file)
+        last_date = date.fromisoformat(state['last_date'])
+        for store in state['stores'].values():
+            store['products'] = set(store['products'])
+            store['sales'] = set(store['sales'])
+    except (ValueError, KeyError, TypeError, AttributeError):
+        print(f'Warning: Invalid YTD state file, rebuilding it - {state_path}')
+        return empty_state
+
+    if last_date.year != yesterday_date.year or last_date >= yesterday_date:
+        return empty_state
+    return {'last_date': last_date, 'stores': state['stores']}
+
+def save_ytd_state(state, state_path):
+    '''
+    Saves the running YTD aggregates to a JSON file.
+
+    The file is written to a temporary file first and then moved into place, so an interrupted
+    write never leaves a truncated state behind.
+
+    Args:
+        state (dict): State as returned by load_ytd_state and updated by update_ytd_state.
+        state_path (Path): Path to the JSON state file.
+    '''
+    stores = {
+        store_id: {**store, 'products': sorted(store['products']), 'sales': sorted(store['sales'])}
+        for store_id, store in state['stores'].items()
+    }
+    temp_path = state_path.with_suffix('.tmp')
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as state_file:
+            json.dump({'last_date': state['last_date'].isoformat(), 'stores': stores}, state_file)
+        os.replace(temp_path, state_path)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+
+def update_ytd_state(state, new_kpis_df, last_date):
+    '''
+    Adds the aggregates of sales not yet included to the running YTD aggregates.
+
+    Revenue is additive; products and sales codes are kept as sets per store, as a sale
+    can span two days and so be split between runs.
+
+    Args:
+        state (dict): State as returned by load_ytd_state.
+        new_kpis_df (pd.DataFrame): Aggregates of the new sales, as returned by aggregate_sales.
+        last_date (date): Last date covered by the new sales.
+    '''
+    for row in new_kpis_df.itertuples():
+        store = state['stores'].setdefault(row.Index, {'revenue': 0.0, 'products': set(), 'sales': set()})
+        store['revenue'] += float(row.revenue)
+        store['products'].update(row.products.tolist())
+        store['sales'].update(row.sales.tolist())
+    state['last_date'] = last_date
+
+def get_ytd_kpis(state):
+    '''
+    Computes the YTD KPIs from the running YTD aggregates.
+
+    Args:
+        state (dict): State as updated by update_ytd_state.
+    
+    Returns:
+        pd.DataFrame: YTD KPIs per store (revenue, distinct_products, distinct_sales, avg_ticket).
+    '''
+    ytd_kpis_df = pd.DataFrame({
+        'store_id': list(state['stores']),
+        'revenue': [store['revenue'] for store in state['stores'].values()],
+        'distinct_products': [len(store['products']) for store in state['stores'].values()],
+        'distinct_sales': [len(store['sales']) for store in state['stores'].values()]
+    })
+    ytd_kpis_df['avg_ticket'] = ytd_kpis_df['revenue'] / ytd_kpis_df['distinct_sales']
+    return ytd_kpis_df
+
+def send_store_report(row, yesterday_date):
+    '''
+    Emails the One Page report of a store to its manager, with the store's YTD backup file attached.
+
+    Args:
+        row (namedtuple): A row of the store emails DataFrame, with store details, formatted KPI tables and backup file path.
+        yesterday_date (date): The date being reported.
+    '''
+    manager_name = row.manager.split(' ')[0]
+    store_name = row.store_name
+    email_to = row.email
+    daily_table = row.daily_table
+    ytd_table = row.ytd_table
+
+    subject = f'OnePage {yesterday_date.strftime(r'%Y/%m/%d')} - {store_name}'
+    email_body = f'''
+    <style>
+        body, table, p, td {{
+            font-family: Calibri, sans-serif;
+        }}
+    </style>  
+    <p>Good Morning, {manager_name}</p>
+    <p>Yesterday's result ({yesterday_date.strftime(r'%m/%d')}) of {store_name} was:</p>
+    <table style='width: 100%; border-collapse: collapse;'>
+        <tr>
+            <td style='width: 50%; vertical-align: top; padding: 10px;'>
+                {daily_table}
+            </td>
+            <td style='width: 50%; vertical-align: top; padding: 10px;'>
+                {ytd_table}
+            </td>
+        </tr>
+    </table>
+    <p>Please find attached the spreadsheet with all the data for further details.</p>
+    <p>Should you have any questions, feel free to reach out.</p>
+    <br>
+    <p>Best Regards,</p>
+    <p>Enrico Petrucci</p>
+    '''
+
+    # Send email with Attachment
+    send_email(EMAIL_FROM, email_to, subject, email_body, file_paths=[row.ytd_file_path])
+
+def send_store_reports(store_rows, yesterday_date):
+    '''
+    Emails the One Page reports of a share of the stores, inside its own COM lifetime.
+
+    COM is initialized before using Outlook, and the Outlook objects cached for the thread are
+    released before COM is uninitialized, even if an email fails.
+
+    Args:
+        store_rows (list): Rows of the store emails DataFrame to be processed.
+        yesterday_date (date): The date being reported.
+    '''
+    pythoncom.CoInitialize()
+    try:
+        for row in store_rows:
+            send_store_report(row, yesterday_date)
+    finally:
+        vars(OUTLOOK_CACHE).clear()
+        pythoncom.CoUninitialize()
+
 def main():
     # Data sources path
     data_sources_path = SCRIPT_DIR / 'data_sources'
 
+    # Ensure the output directory, so only the leaf directories are created later
+    BACKUP_DIR.mkdir(exist_ok=True)
+
     # Data import and renaming
-    emails_df = standardize_column_names(pd.read_excel(data_sources_path / 'emails.xlsx'))
-    products_df = standardize_column_names(pd.read_excel(data_sources_path / 'products.xlsx'))
+    emails_df = read_excel_file(data_sources_path / 'emails.xlsx')
+    products_df = read_excel_file(data_sources_path / 'products.xlsx')
     stores_df = standardize_column_names(pd.read_csv(data_sources_path / 'stores.csv'))
-    sales_df = standardize_column_names(pd.read_excel(data_sources_path / 'sales.xlsx'))
-
-    # Ensure 'date' column is in datetime format
+    sales_df = read_excel_file(data_sources_path / 'sales.xlsx')
+
+    # Encode ids as categoricals shared by all DataFrames, so groupby and merge work on integer codes
+    store_id_dtype = pd.CategoricalDtype(pd.concat([stores_df['store_id'], emails_df['store_id'], sales_df['store_id']]).dropna().unique())
+    for df in (stores_df, emails_df, sales_df):
+        df['store_id'] = df['store_id'].astype(store_id_dtype)
+    product_id_dtype = pd.CategoricalDtype(pd.concat([products_df['product_id'], sales_df['product_id']]).dropna().unique())
+    for df in (products_df, sales_df):
+        df['product_id'] = df['product_id'].astype(product_id_dtype)
+
+    # Index stores and emails by store, so lookups and joins use the index directly
+    stores_df = stores_df.set_index('store_id')
+    emails_df = emails_df.set_index('store_id')
+    emails_df['store_name'] = stores_df['store_name'].reindex(emails_df.index)
+
+    # Ensure 'date' column is in datetime format and sorted, so periods are contiguous row ranges
     sales_df['date'] = pd.to_datetime(sales_df['date'])
+    sales_df = sales_df.sort_values('date', kind='stable', ignore_index=True)
 
     # Get today's and yesterday's dates
     today = date.today()
     yesterday_date = today - timedelta(days=1)
 
-    # Filter daily sales
-    daily_sales_df = sales_df[sales_df['date'] == pd.Timestamp(yesterday_date)]
-
-    # Filter YTD sales
+    # Locate period boundaries on the sorted dates
     current_year = yesterday_date.year
-    ytd_sales_df = sales_df[(sales_df['date'].dt.year == current_year) & (sales_df['date'] <= pd.to_datetime(yesterday_date))]
-
-    ## Indicator 1: Revenue
-
-    # Daily
-    daily_sales_df_merged = daily_sales_df.merge(products_df, on='product_id')[['sales_code', 'date', 'store_id', 'quantity', 'unit_price']]
-    daily_sales_df_merged['revenue'] = daily_sales_df_merged['quantity'] * daily_sales_df_merged['unit_price']
-    daily_revenue_df = daily_sales_df_merged.groupby('store_id')['revenue'].sum().reset_index(name='revenue')
-
-    # YTD
-    ytd_sales_df_merged = ytd_sales_df.merge(products_df, on='product_id')[['sales_code', 'date', 'store_id', 'quantity', 'unit_price']]
-    ytd_sales_df_merged['revenue'] = ytd_sales_df_merged['quantity'] * ytd_sales_df_merged['unit_price']
-    ytd_revenue_df = ytd_sales_df_merged.groupby('store_id')['revenue'].sum().reset_index(name='revenue')
-
-    ## Indicator 2: Product Diversity
+    dates = sales_df['date'].to_numpy()
+    ytd_start = np.searchsorted(dates, np.datetime64(f'{current_year}-01-01'))
+    daily_start = np.searchsorted(dates, np.datetime64(yesterday_date))
+    period_end = np.searchsorted(dates, np.datetime64(yesterday_date), side='right')
 
-    # Daily
-    daily_distinct_products_df = daily_sales_df.groupby('store_id')['product_id'].nunique().reset_index(name='distinct_products')
-
-    # YTD
-    ytd_distinct_products_df = ytd_sales_df.groupby('store_id')['product_id'].nunique().reset_index(name='distinct_products')
-
-    ## Indicator 3: Average Ticket per Sale
+    # Filter daily sales
+    daily_sales_df = sales_df.iloc[daily_start:period_end]
 
-    # Daily
-    daily_distinct_sales_df = daily_sales_df.groupby('store_id')['sales_code'].nunique().reset_index(name='distinct_sales')
-    daily_avg_ticket_df = daily_revenue_df.merge(daily_distinct_sales_df, on='store_id')
-    daily_avg_ticket_df['avg_ticket'] = (daily_avg_ticket_df['revenue'] / daily_avg_ticket_df['distinct_sales'])
+    # Filter YTD sales
+    ytd_sales_df = sales_df.iloc[ytd_start:period_end]
 
-    # YTD
-    ytd_distinct_sales_df = ytd_sales_df.groupby('store_id')['sales_code'].nunique().reset_index(name='distinct_sales')
-    ytd_avg_ticket_df = ytd_revenue_df.merge(ytd_distinct_sales_df, on='store_id')
-    ytd_avg_ticket_df['avg_ticket'] = (ytd_avg_ticket_df['revenue'] / ytd_avg_ticket_df['distinct_sales'])
+    ## Indicators: Revenue, Product Diversity and Average Ticket per Sale
+    # Each period is aggregated in a single pass over its sales, see aggregate_sales()
 
-    ## Combine all KPIs into summary DataFrames
+    # Unit prices aligned with the product categories, so they are looked up by product code instead of a merge
+    # (a trailing NaN is the price of code -1, i.e. sales with a missing product)
+    unit_prices = np.append(products_df.set_index('product_id')['unit_price'].reindex(product_id_dtype.categories).to_numpy(), np.nan)
 
     # Daily KPIs
-    daily_kpis_df = daily_revenue_df.merge(daily_distinct_products_df, on='store_id')
-    daily_kpis_df = daily_kpis_df.merge(daily_avg_ticket_df[['store_id', 'avg_ticket']], on='store_id')
-
-    # YTD KPIs
-    ytd_kpis_df = ytd_revenue_df.merge(ytd_distinct_products_df, on='store_id')
-    ytd_kpis_df = ytd_kpis_df.merge(ytd_avg_ticket_df[['store_id', 'avg_ticket']], on='store_id')
+    daily_sales_df = daily_sales_df.assign(
+        revenue=daily_sales_df['quantity'].to_numpy() * unit_prices[daily_sales_df['product_id'].cat.codes]
+    )
+    daily_aggregates_df = aggregate_sales(daily_sales_df)
+    daily_kpis_df = daily_aggregates_df[['revenue', 'distinct_products', 'distinct_sales']].reset_index()
+    daily_kpis_df['avg_ticket'] = daily_kpis_df['revenue'] / daily_kpis_df['distinct_sales']
+
+    # YTD KPIs (the saved state covers up to the day before yesterday, so yesterday's sales, which may still
+    # be corrected, are recomputed on every run and only the days in between are aggregated and saved)
+    ytd_state = load_ytd_state(YTD_STATE_PATH, yesterday_date)
+    if ytd_state['last_date'] is None:
+        new_start = ytd_start
+    else:
+        new_start = np.searchsorted(dates, np.datetime64(ytd_state['last_date']), side='right')
+    new_sales_df = sales_df.iloc[new_start:daily_start]
+    new_sales_df = new_sales_df.assign(
+        revenue=new_sales_df['quantity'].to_numpy() * unit_prices[new_sales_df['product_id'].cat.codes]
+    )
+    update_ytd_state(ytd_state, aggregate_sales(new_sales_df), yesterday_date - timedelta(days=1))
+    save_ytd_state(ytd_state, YTD_STATE_PATH)
+    update_ytd_state(ytd_state, daily_aggregates_df, yesterday_date)
+    ytd_kpis_df = get_ytd_kpis(ytd_state)
+    ytd_kpis_df['store_id'] = ytd_kpis_df['store_id'].astype(store_id_dtype)
 
     # Merging both Daily and YTD
     all_kpis_df = daily_kpis_df.merge(ytd_kpis_df, on='store_id', suffixes=('_daily', '_YTD'))
@@ -260,100 +635,73 @@ def main():
         raise ValueError('EMAIL_TO environment variable is not set.')
 
     # Change dataframe emails to personal email for testing
-    emails_df['email'] = emails_df['email'].str.replace(
-        r"email\+(.*?)@address\.com",  # Regex to extract manager name
-        lambda match: f"{email_to.split('@')[0]}+{match.group(1)}@{email_to.split('@')[1]}",
-        regex=True
-    )
-    emails_with_kpis_df = emails_df.merge(stores_df, on='store_id', how='left').merge(all_kpis_df, on='store_id', how='left')
-
-    for row in emails_with_kpis_df.itertuples():
-        if row.store_id == 'BOARD':
-            continue
-        
-        manager_name = row.manager.split(' ')[0]
-        store_name = row.store_name
-        store_id = row.store_id
-        email_to = row.email
-
-        daily_kpis = construct_kpi_list(row, DAILY_TARGETS, 'daily')
-        ytd_kpis = construct_kpi_list(row, YTD_TARGETS, 'YTD')
-
-        daily_table = format_kpi_table(daily_kpis, 'Daily Values')
-        ytd_table = format_kpi_table(ytd_kpis, 'YTD Values', is_YTD=True)
-
-        subject = f'OnePage {yesterday_date.strftime(r'%Y/%m/%d')} - {store_name}'
-        email_body = f'''
-        <style>
-            body, table, p, td {{
-                font-family: Calibri, sans-serif;
-            }}
-        </style>  
-        <p>Good Morning, {manager_name}</p>
-        <p>Yesterday's result ({yesterday_date.strftime(r'%m/%d')}) of {store_name} was:</p>
-        <table style='width: 100%; border-collapse: collapse;'>
-            <tr>
-                <td style='width: 50%; vertical-align: top; padding: 10px;'>
-                    {daily_table}
-                </td>
-                <td style='width: 50%; vertical-align: top; padding: 10px;'>
-                    {ytd_table}
-                </td>
-            </tr>
-        </table>
-        <p>Please find attached the spreadsheet with all the data for further details.</p>
-        <p>Should you have any questions, feel free to reach out.</p>
-        <br>
-        <p>Best Regards,</p>
-        <p>Enrico Petrucci</p>
-        '''
-
-        # Generate and Save the Year-to-Date Excel File
+    email_to_user, email_to_domain = email_to.split('@', 1)
+    manager_aliases = emails_df['email'].str.extract(r"email\+(.*?)@address\.com", expand=False)  # Regex to extract manager name
+    has_alias = manager_aliases.notna()
+    emails_df.loc[has_alias, 'email'] = email_to_user + '+' + manager_aliases[has_alias] + '@' + email_to_domain
+    emails_with_kpis_df = emails_df.join(all_kpis_df.set_index('store_id'), how='left')
+
+    # Enrich YTD sales with additional details once, then split them per store for the backup files
+    ytd_sales_df_enriched = ytd_sales_df.merge(products_df, on='product_id').merge(stores_df, left_on='store_id', right_index=True)
+    ytd_sales_df_enriched['date'] = ytd_sales_df_enriched['date'].dt.strftime(r'%Y/%m/%d')
+    ytd_sales_by_store = {
+        store_id: restore_column_names(store_sales_df[['sales_code', 'date', 'product_name', 'store_name', 'quantity', 'unit_price']])
+        for store_id, store_sales_df in ytd_sales_df_enriched.groupby('store_id', observed=True, sort=False)
+    }
+
+    # Format the KPI tables of all stores at once
+    store_emails_df = emails_with_kpis_df[emails_with_kpis_df.index != 'BOARD'].copy()
+    store_emails_df['daily_table'] = format_kpi_tables(store_emails_df, DAILY_TARGETS, 'daily', 'Daily Values')
+    store_emails_df['ytd_table'] = format_kpi_tables(store_emails_df, YTD_TARGETS, 'YTD', 'YTD Values', is_YTD=True)
+
+    # Backup file of each store, with its YTD sales data
+    excel_exports = []
+    ytd_file_paths = []
+    for store_id, store_name in zip(store_emails_df.index, store_emails_df['store_name']):
         store_name_safe = store_name.casefold().replace(' ', '_')
-        backup_dir = SCRIPT_DIR / 'store_backup_files' / store_name_safe
-        backup_dir.mkdir(parents=True, exist_ok=True)
-        
-        # Filter sales data for the store and enrich with additional details 
-        ytd_sales_df_filtered = ytd_sales_df[ytd_sales_df['store_id'] == store_id]
-        ytd_sales_df_filtered = ytd_sales_df_filtered.merge(products_df, on='product_id').merge(stores_df, on='store_id')
-        ytd_sales_df_filtered['date'] = ytd_sales_df_filtered['date'].dt.strftime(r'%Y/%m/%d')
-
-        # Select and rename columns for clarity
-        ytd_sales_df_filtered = ytd_sales_df_filtered[['sales_code', 'date', 'product_name', 'store_name', 'quantity', 'unit_price']]
-        ytd_sales_df_filtered = restore_column_names(ytd_sales_df_filtered)
-        
-        # Save the backup .xlsx file
+        backup_dir = BACKUP_DIR / store_name_safe
+        backup_dir.mkdir(exist_ok=True)
+
         ytd_file_path = backup_dir / f'{store_name_safe}_{yesterday_date.strftime(r'%Y_%m_%d')}_sales.xlsx'
-        ytd_sales_df_filtered.to_excel(ytd_file_path, index=False)
-        
-        # Send email with Attachment
-        send_email(EMAIL_FROM, email_to, subject, email_body, file_paths=[ytd_file_path])
-        # break
+        excel_exports.append((ytd_sales_by_store[store_id], ytd_file_path))
+        ytd_file_paths.append(ytd_file_path)
+    store_emails_df['ytd_file_path'] = ytd_file_paths
 
-    # Board of Directors - Email
+    # Board of Directors - Rankings
 
     ranking_daily_df, best_daily_store, best_daily_store_revenue, worst_daily_store, worst_daily_store_revenue = get_ranking_info(
-        daily_revenue_df.merge(stores_df, on='store_id')
+        daily_kpis_df.merge(stores_df, left_on='store_id', right_index=True)
     )
     ranking_ytd_df, best_ytd_store, best_ytd_store_revenue, worst_ytd_store, worst_ytd_store_revenue = get_ranking_info(
-        ytd_revenue_df.merge(stores_df, on='store_id')
+        ytd_kpis_df.merge(stores_df, left_on='store_id', right_index=True)
     )
 
     # Ensure directory for rankings
-    ranking_dir = SCRIPT_DIR / 'store_backup_files' / 'board_of_directors'
-    ranking_dir.mkdir(parents=True, exist_ok=True)
+    ranking_dir = BACKUP_DIR / 'board_of_directors'
+    ranking_dir.mkdir(exist_ok=True)
 
-    # Generate and save ranking files
+    # Generate ranking files
     daily_export_path = ranking_dir / f'daily_ranking_{yesterday_date.strftime(r'%Y_%m_%d')}.xlsx'
-    ranking_daily_df = restore_column_names(ranking_daily_df)
-    ranking_daily_df.to_excel(daily_export_path, index=False)
+    excel_exports.append((restore_column_names(ranking_daily_df), daily_export_path))
 
     ytd_export_path = ranking_dir / f'ytd_ranking_{yesterday_date.strftime(r'%Y_%m_%d')}.xlsx'
-    ranking_ytd_df = restore_column_names(ranking_ytd_df)
-    ranking_ytd_df.to_excel(ytd_export_path, index=False)
+    excel_exports.append((restore_column_names(ranking_ytd_df), ytd_export_path))
+
+    # Save all Excel files in parallel (zip compression releases the GIL)
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        list(executor.map(lambda export: save_excel_file(*export), excel_exports))
+
+    # Email the stores in parallel (Outlook calls are IO-bound); each worker handles a share of the stores
+    store_rows = list(store_emails_df.itertuples())
+    # store_rows = store_rows[:1] # Uncomment for testing to send/preview only one email
+    store_shares = [store_rows[worker::MAX_WORKERS] for worker in range(MAX_WORKERS)]
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        list(executor.map(lambda share: send_store_reports(share, yesterday_date), store_shares))
+
+    # Board of Directors - Email
 
     # Email Sending
-    email_to = emails_df.loc[emails_df['store_id'] == 'BOARD', 'email'].iloc[0]
+    email_to = emails_df.at['BOARD', 'email']
     subject = f'Daily and YTD Store Revenue Rankings - {yesterday_date.strftime(r'%Y/%m/%d')}'
     email_body = f'''
         <style>